@@ -1,10 +1,14 @@
 import json
 from django.contrib import admin
-from django.utils.html import format_html
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Reverse, Right, StrIndex
+from django.utils.html import escape, format_html
+from django.utils.safestring import mark_safe
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 from django.urls import reverse
-from django.contrib.auth import get_user_model
 from unfold.decorators import action, display
 from unfold.admin.filters import (
     DropdownFilter, 
@@ -14,9 +18,28 @@ from unfold.admin.filters import (
 )
 from superapp.apps.admin_portal.admin import SuperAppModelAdmin
 from superapp.apps.admin_portal.sites import superapp_admin_site
-from superapp.apps.error_tracking.models import ErrorLog, ErrorLevel
+from superapp.apps.error_tracking.models import ErrorLog, ErrorLevel, ExceptionTypeStat
+from superapp.apps.error_tracking.services.lookup_cache import USERS_CACHE_KEY, cached_lookup
 
-User = get_user_model()
+ERROR_LEVEL_COLORS = {
+    ErrorLevel.DEBUG: 'secondary',
+    ErrorLevel.INFO: 'info',
+    ErrorLevel.WARNING: 'warning',
+    ErrorLevel.ERROR: 'danger',
+    ErrorLevel.CRITICAL: 'dark',
+}
+
+OPEN_BADGE = mark_safe('<span class="badge badge-danger">✗ Open</span>')
+
+_USER_ADMIN_URL = None
+
+
+def _user_admin_url(user_id):
+    """Reverse the user change URL once and only fill in the id per row."""
+    global _USER_ADMIN_URL
+    if _USER_ADMIN_URL is None:
+        _USER_ADMIN_URL = reverse('admin:auth_user_change', args=[0]).replace('/0/', '/{}/')
+    return _USER_ADMIN_URL.format(user_id)
 
 
 class ErrorLevelDropdownFilter(DropdownFilter):
@@ -43,8 +66,18 @@ class UserDropdownFilter(DropdownFilter):
     parameter_name = 'user'
     
     def lookups(self, request, model_admin):
-        users = User.objects.filter(errorlog__isnull=False).distinct().values_list('id', 'username')[:100]
+        users = cached_lookup(USERS_CACHE_KEY, self._get_users)
         return [(user_id, username) for user_id, username in users]
+    
+    @staticmethod
+    def _get_users():
+        queryset = ErrorLog.objects.filter(user__isnull=False)
+        if connections[queryset.db].vendor == 'postgresql':
+            # DISTINCT ON (user_id) walks the (user, last_occurrence) index instead of sorting every row
+            queryset = queryset.order_by('user_id').distinct('user_id')
+        else:
+            queryset = queryset.order_by().distinct()
+        return list(queryset.values_list('user_id', 'user__username')[:100])
 
 
 class ExceptionTypeDropdownFilter(DropdownFilter):
@@ -52,7 +85,8 @@ class ExceptionTypeDropdownFilter(DropdownFilter):
     parameter_name = 'exception_type'
     
     def lookups(self, request, model_admin):
-        exception_types = ErrorLog.objects.values_list('exception_type', flat=True).distinct()[:50]
+        # Read from the per-type counter table instead of a DISTINCT over all errors
+        exception_types = ExceptionTypeStat.objects.order_by('-last_seen').values_list('name', flat=True)[:50]
         return [(exc_type, exc_type) for exc_type in exception_types if exc_type]
 
 
@@ -107,13 +141,13 @@ class ErrorLogAdmin(SuperAppModelAdmin):
         ('first_occurrence', RangeDateFilter),
     ]
     
+    # Only trigram-indexed columns (services.search_indexes): the OR can only use the
+    # indexes if every branch is indexed, so users are found via UserDropdownFilter
     search_fields = [
         'exception_type',
         'exception_message',
         'file_path',
         'function_name',
-        'user__username',
-        'user__email',
         'request_path',
     ]
     
@@ -122,6 +156,7 @@ class ErrorLogAdmin(SuperAppModelAdmin):
         'last_occurrence',
         'created_at',
         'updated_at',
+        'user_agent_display',
         'debug_details_display',
         'stack_trace_display',
         'count'
@@ -153,7 +188,7 @@ class ErrorLogAdmin(SuperAppModelAdmin):
                 'request_method',
                 'request_path',
                 'ip_address',
-                'user_agent',
+                'user_agent_display',
             ),
             'classes': ('collapse',)
         }),
@@ -184,73 +219,64 @@ class ErrorLogAdmin(SuperAppModelAdmin):
     
     @display(description=_('Level'), ordering='error_level')
     def error_level_badge(self, obj):
-        colors = {
-            'debug': 'secondary',
-            'info': 'info',
-            'warning': 'warning',
-            'error': 'danger',
-            'critical': 'dark'
-        }
-        color = colors.get(obj.error_level, 'secondary')
-        return format_html(
-            '<span class="badge badge-{}">{}</span>',
-            color,
-            obj.get_error_level_display().upper()
-        )
+        color = ERROR_LEVEL_COLORS.get(obj.error_level, 'secondary')
+        return mark_safe(f'<span class="badge badge-{color}">{obj.get_error_level_display().upper()}</span>')
     
     @display(description=_('Message'), ordering='exception_message')
     def short_message(self, obj):
-        message = obj.exception_message[:80]
-        if len(obj.exception_message) > 80:
-            message += '...'
-        return format_html('<span title="{}">{}</span>', obj.exception_message, message)
+        message = obj.exception_message
+        short = f'{message[:80]}...' if len(message) > 80 else message
+        return mark_safe(f'<span title="{escape(message)}">{escape(short)}</span>')
     
     @display(description=_('Location'))
     def location_link(self, obj):
+        # short_file is the basename annotated by get_queryset
         if obj.line_number:
-            location = f'{obj.file_path.split("/")[-1]}:{obj.line_number}'
+            location = f'{obj.short_file}:{obj.line_number}'
             if obj.function_name:
                 location += f' ({obj.function_name})'
         else:
-            location = obj.file_path.split("/")[-1] if obj.file_path else 'Unknown'
+            location = obj.short_file or 'Unknown'
         
-        return format_html(
-            '<code title="{}">{}</code>',
-            obj.file_path,
-            location
-        )
+        return mark_safe(f'<code title="{escape(obj.file_path)}">{escape(location)}</code>')
     
     @display(description=_('User'), ordering='user__username')
     def user_link(self, obj):
-        if obj.user:
-            url = reverse('admin:auth_user_change', args=[obj.user.id])
-            return format_html('<a href="{}">{}</a>', url, obj.user.username)
+        if obj.user_id:
+            return mark_safe(f'<a href="{_user_admin_url(obj.user_id)}">{escape(obj.user.username)}</a>')
         return '-'
     
     @display(description=_('Status'), ordering='resolved', boolean=True)
     def resolved_badge(self, obj):
         if obj.resolved:
-            return format_html(
-                '<span class="badge badge-success" title="Resolved by {} on {}">✓ Resolved</span>',
-                obj.resolved_by.username if obj.resolved_by else 'Unknown',
-                obj.resolved_at.strftime('%Y-%m-%d %H:%M') if obj.resolved_at else 'Unknown'
+            resolved_by = escape(obj.resolved_by.username) if obj.resolved_by else 'Unknown'
+            resolved_at = obj.resolved_at.strftime('%Y-%m-%d %H:%M') if obj.resolved_at else 'Unknown'
+            return mark_safe(
+                f'<span class="badge badge-success" title="Resolved by {resolved_by} on {resolved_at}">✓ Resolved</span>'
             )
-        return format_html('<span class="badge badge-danger">✗ Open</span>')
+        return OPEN_BADGE
+    
+    @display(description=_('User Agent'))
+    def user_agent_display(self, obj):
+        details = getattr(obj, 'details', None)
+        return details.user_agent if details and details.user_agent else '-'
     
     @display(description=_('Stack Trace'))
     def stack_trace_display(self, obj):
-        if obj.stack_trace:
-            return format_html('<pre style="white-space: pre-wrap; max-height: 400px; overflow-y: auto;">{}</pre>', obj.stack_trace)
+        details = getattr(obj, 'details', None)
+        if details and details.stack_trace:
+            return format_html('<pre style="white-space: pre-wrap; max-height: 400px; overflow-y: auto;">{}</pre>', details.stack_trace)
         return '-'
     
     @display(description=_('Debug Details'))
     def debug_details_display(self, obj):
-        if obj.debug_details:
+        details = getattr(obj, 'details', None)
+        if details and details.debug_details:
             try:
-                formatted_json = json.dumps(obj.debug_details, indent=2, default=str)
+                formatted_json = json.dumps(details.debug_details, indent=2, default=str)
                 return format_html('<pre style="white-space: pre-wrap; max-height: 400px; overflow-y: auto;">{}</pre>', formatted_json)
             except (TypeError, ValueError):
-                return str(obj.debug_details)
+                return str(details.debug_details)
         return '-'
     
     @action(
@@ -260,6 +286,7 @@ class ErrorLogAdmin(SuperAppModelAdmin):
     def mark_as_resolved(self, request, queryset):
         updated = queryset.filter(resolved=False).update(
             resolved=True,
+            fingerprint=None,
             resolved_by=request.user,
             resolved_at=timezone.now()
         )
@@ -270,12 +297,14 @@ class ErrorLogAdmin(SuperAppModelAdmin):
         attrs={'icon': 'cancel', 'variant': 'warning'}
     )
     def mark_as_unresolved(self, request, queryset):
-        updated = queryset.filter(resolved=True).update(
-            resolved=False,
-            resolved_by=None,
-            resolved_at=None
-        )
-        self.message_user(request, _(f'{updated} error(s) marked as unresolved.'))
+        # Saved one by one so each reopened error can claim its fingerprint back
+        reopened = list(queryset.filter(resolved=True))
+        for error in reopened:
+            error.resolved = False
+            error.resolved_by = None
+            error.resolved_at = None
+            error.save(update_fields=['resolved', 'resolved_by', 'resolved_at', 'fingerprint', 'updated_at'])
+        self.message_user(request, _(f'{len(reopened)} error(s) marked as unresolved.'))
     
     @action(
         description=_('Delete resolved errors'),
@@ -286,7 +315,25 @@ class ErrorLogAdmin(SuperAppModelAdmin):
         self.message_user(request, _(f'{deleted_count} resolved error(s) deleted.'))
     
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('user', 'resolved_by')
+        return super().get_queryset(request).select_related('user', 'resolved_by').annotate(
+            short_file=Case(
+                When(
+                    file_path__contains='/',
+                    then=Right('file_path', StrIndex(Reverse('file_path'), Value('/')) - 1)
+                ),
+                default=F('file_path'),
+            )
+        )
+    
+    def get_object(self, request, object_id, from_field=None):
+        # Only the change view needs the details row, the changelist stays on the narrow table
+        queryset = self.get_queryset(request).select_related('details')
+        field = ErrorLog._meta.pk if from_field is None else ErrorLog._meta.get_field(from_field)
+        try:
+            object_id = field.to_python(object_id)
+            return queryset.get(**{field.name: object_id})
+        except (ErrorLog.DoesNotExist, ValidationError, ValueError):
+            return None
     
     def has_delete_permission(self, request, obj=None):
         return request.user.is_superuser
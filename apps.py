@@ -1,7 +1,14 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 class ErrorTrackingConfig(AppConfig):
     name = 'superapp.apps.error_tracking'
     default_auto_field = 'django.db.models.BigAutoField'
     verbose_name = 'Error Tracking'
 
+    def ready(self):
+        from superapp.apps.error_tracking import signals  # noqa: F401
+
+        if getattr(settings, 'ERROR_TRACKING_ASYNC_WRITES', True):
+            from superapp.apps.error_tracking.services.writer import start_writer
+            start_writer()
@@ -1,3 +1,5 @@
 from .error_log import ErrorLog, ErrorLevel
+from .error_log_details import ErrorLogDetails
+from .exception_type_stat import ExceptionTypeStat
 
-__all__ = ['ErrorLog', 'ErrorLevel']
\ No newline at end of file
+__all__ = ['ErrorLog', 'ErrorLevel', 'ErrorLogDetails', 'ExceptionTypeStat']
\ No newline at end of file
@@ -1,34 +1,34 @@
-import json
-import logging
+import hashlib
+from datetime import timedelta
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 
 User = get_user_model()
-logger = logging.getLogger(__name__)
 
+_ONE_DAY = timedelta(days=1)
 
-class ErrorLevel(models.TextChoices):
-    DEBUG = 'debug', _('Debug')
-    INFO = 'info', _('Info')
-    WARNING = 'warning', _('Warning')
-    ERROR = 'error', _('Error')
-    CRITICAL = 'critical', _('Critical')
+
+class ErrorLevel(models.IntegerChoices):
+    DEBUG = 0, _('Debug')
+    INFO = 1, _('Info')
+    WARNING = 2, _('Warning')
+    ERROR = 3, _('Error')
+    CRITICAL = 4, _('Critical')
 
 
 class ErrorLog(models.Model):
-    error_level = models.CharField(
-        max_length=10,
+    error_level = models.PositiveSmallIntegerField(
         choices=ErrorLevel.choices,
         default=ErrorLevel.ERROR,
-        verbose_name=_('Error Level'),
-        db_index=True
+        verbose_name=_('Error Level')
     )
     
     exception_type = models.CharField(
         max_length=255,
         verbose_name=_('Exception Type'),
-        db_index=True,
         help_text=_('Type of exception (e.g., ValueError, KeyError)')
     )
     
@@ -40,7 +40,6 @@ class ErrorLog(models.Model):
     file_path = models.CharField(
         max_length=500,
         verbose_name=_('File Path'),
-        db_index=True,
         help_text=_('Full path to the file where the error occurred')
     )
     
@@ -84,12 +83,6 @@ class ErrorLog(models.Model):
         help_text=_('URL path of the request')
     )
     
-    user_agent = models.TextField(
-        blank=True,
-        verbose_name=_('User Agent'),
-        help_text=_('Browser user agent string')
-    )
-    
     ip_address = models.GenericIPAddressField(
         null=True,
         blank=True,
@@ -98,19 +91,6 @@ class ErrorLog(models.Model):
         help_text=_('Client IP address')
     )
     
-    stack_trace = models.TextField(
-        blank=True,
-        verbose_name=_('Stack Trace'),
-        help_text=_('Full stack trace of the error')
-    )
-    
-    debug_details = models.JSONField(
-        default=dict,
-        blank=True,
-        verbose_name=_('Debug Details'),
-        help_text=_('Additional debug information, request data, context variables, etc.')
-    )
-    
     resolved = models.BooleanField(
         default=False,
         verbose_name=_('Resolved'),
@@ -141,6 +121,16 @@ class ErrorLog(models.Model):
         help_text=_('Additional notes about the error or resolution')
     )
     
+    fingerprint = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        unique=True,
+        editable=False,
+        verbose_name=_('Fingerprint'),
+        help_text=_('Hash used to group identical unresolved errors')
+    )
+    
     count = models.PositiveIntegerField(
         default=1,
         verbose_name=_('Occurrence Count'),
@@ -172,28 +162,48 @@ class ErrorLog(models.Model):
             models.Index(fields=['error_level', 'resolved', 'last_occurrence']),
             models.Index(fields=['exception_type', 'file_path']),
             models.Index(fields=['user', 'last_occurrence']),
+            # The admin search trigram indexes are PostgreSQL-only and created by
+            # services.search_indexes.create_trigram_indexes in a migration
         ]
 
     def __str__(self):
         return f'{self.exception_type}: {self.exception_message[:100]}...'
 
     def save(self, *args, **kwargs):
-        if self.debug_details and isinstance(self.debug_details, str):
-            try:
-                self.debug_details = json.loads(self.debug_details)
-            except (json.JSONDecodeError, TypeError):
-                logger.warning(f'Invalid JSON in debug_details for ErrorLog {self.id}')
-                self.debug_details = {'raw_data': self.debug_details}
+        # Only unresolved errors hold a fingerprint, so a resolved error that
+        # happens again is grouped into a fresh row instead of the old one.
+        if self.resolved:
+            self.fingerprint = None
+        elif not self.fingerprint:
+            self.claim_fingerprint()
         super().save(*args, **kwargs)
 
+    def claim_fingerprint(self):
+        """Give a new or reopened error its fingerprint unless another unresolved error holds it."""
+        fingerprint = self.compute_fingerprint(
+            self.exception_type,
+            self.file_path,
+            self.line_number,
+            self.exception_message,
+        )
+        if ErrorLog.objects.filter(fingerprint=fingerprint).exclude(pk=self.pk).exists():
+            # The same error re-occurred after this one was resolved and already has
+            # an open row collecting the occurrences; keep this one out of grouping
+            self.fingerprint = None
+            return
+        self.fingerprint = fingerprint
+
+    @staticmethod
+    def compute_fingerprint(exception_type, file_path, line_number, exception_message):
+        key = f'{exception_type}|{file_path}|{line_number}|{exception_message}'
+        return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
     @property
     def location_display(self):
         if self.line_number:
             return f'{self.file_path}:{self.line_number}'
         return self.file_path
 
-    @property
+    @cached_property
     def is_recent(self):
-        from django.utils import timezone
-        from datetime import timedelta
-        return self.last_occurrence > timezone.now() - timedelta(days=1)
+        return self.last_occurrence > timezone.now() - _ONE_DAY
@@ -0,0 +1,59 @@
+import json
+import logging
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+from superapp.apps.error_tracking.models.error_log import ErrorLog
+
+logger = logging.getLogger(__name__)
+
+
+class ErrorLogDetails(models.Model):
+    """Large, rarely read columns of an ErrorLog, kept apart so the hot error rows stay narrow."""
+
+    error = models.OneToOneField(
+        ErrorLog,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='details',
+        verbose_name=_('Error')
+    )
+    
+    user_agent = models.TextField(
+        blank=True,
+        verbose_name=_('User Agent'),
+        help_text=_('Browser user agent string')
+    )
+    
+    stack_trace = models.TextField(
+        blank=True,
+        verbose_name=_('Stack Trace'),
+        help_text=_('Full stack trace of the error')
+    )
+    
+    debug_details = models.JSONField(
+        default=dict,
+        blank=True,
+        encoder=DjangoJSONEncoder,
+        verbose_name=_('Debug Details'),
+        help_text=_('Additional debug information, request data, context variables, etc.')
+    )
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _('Error Log Details')
+        verbose_name_plural = _('Error Log Details')
+
+    def __str__(self):
+        return f'Details for {self.error_id}'
+
+    def save(self, *args, **kwargs):
+        if self.debug_details and isinstance(self.debug_details, str):
+            try:
+                self.debug_details = json.loads(self.debug_details)
+            except (json.JSONDecodeError, TypeError):
+                logger.warning(f'Invalid JSON in debug_details for ErrorLog {self.error_id}')
+                self.debug_details = {'raw_data': self.debug_details}
+        super().save(*args, **kwargs)
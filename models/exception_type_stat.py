@@ -0,0 +1,34 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class ExceptionTypeStat(models.Model):
+    name = models.CharField(
+        max_length=255,
+        primary_key=True,
+        verbose_name=_('Exception Type'),
+        help_text=_('Type of exception (e.g., ValueError, KeyError)')
+    )
+    
+    last_seen = models.DateTimeField(
+        verbose_name=_('Last Seen'),
+        db_index=True,
+        help_text=_('When an error of this type last occurred, refreshed at most once a minute per error')
+    )
+    
+    count = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Error Count'),
+        help_text=_('Number of distinct errors recorded with this type')
+    )
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _('Exception Type Stat')
+        verbose_name_plural = _('Exception Type Stats')
+        ordering = ['-last_seen']
+
+    def __str__(self):
+        return self.name
@@ -1,34 +1,45 @@
-import os
+import queue
+import re
 import sys
 import traceback
-import inspect
 import logging
 from typing import Optional, Dict, Any, Union
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from superapp.apps.error_tracking.models import ErrorLog, ErrorLevel
+from superapp.apps.error_tracking.services.writer import debounce_hit, enqueue_error_log, remember_write, write_error_log
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
-# Check for debug logging from environment
-DEBUG_ERROR_TRACKING = os.environ.get('DEBUG_ERROR_TRACKING', 'false').lower() == 'true'
+# Only these levels get a formatted stack trace, capped at MAX_STACK_TRACE_LENGTH characters
+STACK_TRACE_LEVELS = {ErrorLevel.ERROR, ErrorLevel.CRITICAL}
+MAX_STACK_TRACE_LENGTH = 32768
+
+# POST keys whose values are never stored
+_SENSITIVE_RE = re.compile(r'password|token|api[_-]?key|secret|csrf', re.IGNORECASE)
 
 def get_client_ip(request):
     """Extract client IP address from request."""
     if not request:
         return None
     
+    # Memoized on the request, which may track several errors
+    if hasattr(request, '_error_tracking_ip'):
+        return request._error_tracking_ip
+    
     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    x_real_ip = request.META.get('HTTP_X_REAL_IP')
     if x_forwarded_for:
-        return x_forwarded_for.split(',')[0].strip()
+        ip_address = x_forwarded_for.split(',')[0].strip()
+    elif x_real_ip:
+        ip_address = x_real_ip.strip()
+    else:
+        ip_address = request.META.get('REMOTE_ADDR')
     
-    x_real_ip = request.META.get('HTTP_X_REAL_IP')
-    if x_real_ip:
-        return x_real_ip.strip()
-        
-    return request.META.get('REMOTE_ADDR')
+    request._error_tracking_ip = ip_address
+    return ip_address
 
 
 def get_request_details(request) -> Dict[str, Any]:
@@ -36,6 +47,10 @@ def get_request_details(request) -> Dict[str, Any]:
     if not request:
         return {}
     
+    cached = getattr(request, '_error_tracking_context', None)
+    if cached is not None:
+        return cached
+    
     details = {
         'method': getattr(request, 'method', ''),
         'path': getattr(request, 'path', ''),
@@ -49,30 +64,40 @@ def get_request_details(request) -> Dict[str, Any]:
     
     # Add GET/POST data (be careful with sensitive data)
     if hasattr(request, 'GET') and request.GET:
-        details['get_params'] = dict(request.GET.items())
+        details['get_params'] = request.GET.dict()
     
     if hasattr(request, 'POST') and request.POST:
         # Filter out sensitive fields
-        sensitive_fields = {'password', 'token', 'api_key', 'secret', 'csrf_token'}
-        post_data = {}
-        for key, value in request.POST.items():
-            if any(sensitive in key.lower() for sensitive in sensitive_fields):
-                post_data[key] = '[FILTERED]'
-            else:
-                post_data[key] = value
-        details['post_params'] = post_data
+        details['post_params'] = {
+            key: '[FILTERED]' if _SENSITIVE_RE.search(key) else value
+            for key, value in request.POST.items()
+        }
     
+    request._error_tracking_context = details
     return details
 
 
-def extract_traceback_info(exception: Exception) -> Dict[str, Any]:
-    """Extract detailed information from exception traceback."""
-    exc_type, exc_value, exc_traceback = sys.exc_info()
+def get_user_details(user, request=None) -> Dict[str, Any]:
+    """Extract user details, memoized on the request for repeated calls."""
+    cached = getattr(request, '_error_tracking_user', None)
+    if cached is not None and cached['id'] == user.id:
+        return cached
     
-    if not exc_traceback:
-        # If no current exception, try to get traceback from the exception
-        exc_traceback = exception.__traceback__
+    details = {
+        'id': user.id,
+        'username': getattr(user, 'username', ''),
+        'email': getattr(user, 'email', ''),
+        'is_staff': getattr(user, 'is_staff', False),
+        'is_superuser': getattr(user, 'is_superuser', False),
+    }
     
+    if request is not None:
+        request._error_tracking_user = details
+    return details
+
+
+def extract_traceback_info(exception: Exception) -> Dict[str, Any]:
+    """Extract detailed information from exception traceback."""
     info = {
         'exception_type': exception.__class__.__name__,
         'exception_message': str(exception),
@@ -82,30 +107,61 @@ def extract_traceback_info(exception: Exception) -> Dict[str, Any]:
         'function_name': '',
     }
     
-    if exc_traceback:
-        # Get full stack trace
-        info['stack_trace'] = ''.join(traceback.format_exception(
-            exc_type or type(exception), 
-            exc_value or exception, 
-            exc_traceback
-        ))
-        
-        # Get the last frame (where the error occurred)
-        last_frame = exc_traceback
-        while last_frame.tb_next:
-            last_frame = last_frame.tb_next
+    if exception.__traceback__:
+        # One walk of the traceback gives both the formatted trace and the frames
+        tbe = traceback.TracebackException.from_exception(exception, capture_locals=False)
+        stack_trace = ''.join(tbe.format())
+        if len(stack_trace) > MAX_STACK_TRACE_LENGTH:
+            # Keep the end: the innermost frames and the exception line are the useful part
+            stack_trace = '[...truncated]\n' + stack_trace[-MAX_STACK_TRACE_LENGTH:]
+        info['stack_trace'] = stack_trace
         
-        frame = last_frame.tb_frame
-        info['file_path'] = frame.f_code.co_filename
-        info['line_number'] = last_frame.tb_lineno
-        info['function_name'] = frame.f_code.co_name
+        # The last frame is where the error occurred
+        if tbe.stack:
+            last_frame = tbe.stack[-1]
+            info['file_path'] = last_frame.filename
+            info['line_number'] = last_frame.lineno
+            info['function_name'] = last_frame.name
     
     return info
 
 
+def _traceback_location(exception: Exception) -> Dict[str, Any]:
+    """Where the exception was raised, from its last traceback frame without formatting anything."""
+    tb = exception.__traceback__
+    if tb is None:
+        return {}
+    while tb.tb_next is not None:
+        tb = tb.tb_next
+    code = tb.tb_frame.f_code
+    return {
+        'file_path': code.co_filename,
+        'line_number': tb.tb_lineno,
+        'function_name': code.co_name,
+    }
+
+
+def _save_error(fields: Dict[str, Any]) -> Optional[ErrorLog]:
+    """Write an occurrence synchronously or hand it to the background writer."""
+    if not getattr(settings, 'ERROR_TRACKING_ASYNC_WRITES', True):
+        return write_error_log(fields)
+    
+    # Hand the write off to the background writer so the request never waits on the DB
+    try:
+        enqueue_error_log(fields)
+    except queue.Full:
+        logger.error(
+            f"Error tracking queue is full, dropped: {fields['exception_type']} - {fields['exception_message']}"
+        )
+    else:
+        logger.debug("[ERROR_TRACKING] Queued error with fingerprint %s", fields['fingerprint'])
+        remember_write(fields)
+    return None
+
+
 def track_error(
     exception: Optional[Union[Exception, str]] = None,
-    error_level: str = ErrorLevel.ERROR,
+    error_level: Union[int, str] = ErrorLevel.ERROR,
     custom_message: Optional[str] = None,
     debug_details: Optional[Dict[str, Any]] = None,
     request=None,
@@ -120,7 +176,7 @@ def track_error(
     
     Args:
         exception: Exception object or error message string
-        error_level: Error level (debug, info, warning, error, critical)
+        error_level: ErrorLevel value or its name (debug, info, warning, error, critical)
         custom_message: Custom error message (overrides exception message)
         debug_details: Additional debug information dictionary
         request: Django request object (for extracting request details)
@@ -131,11 +187,14 @@ def track_error(
         **kwargs: Additional fields to add to debug_details
     
     Returns:
-        ErrorLog instance or None if tracking failed
+        The new ErrorLog instance when ERROR_TRACKING_ASYNC_WRITES is disabled,
+        otherwise None (also None if an existing error was updated or tracking failed)
     """
     try:
-        if DEBUG_ERROR_TRACKING:
-            logger.debug(f"[ERROR_TRACKING] Starting error tracking for: {exception}")
+        logger.debug("[ERROR_TRACKING] Starting error tracking for: %s", exception)
+        
+        if isinstance(error_level, str):
+            error_level = ErrorLevel[error_level.upper()]
         
         # Initialize error info
         error_info = {
@@ -147,18 +206,37 @@ def track_error(
             'function_name': function_name or '',
         }
         
-        # Extract traceback info if exception is provided
+        # Extract traceback info if exception is provided; lower levels skip formatting the trace
         if isinstance(exception, Exception):
-            error_info.update(extract_traceback_info(exception))
+            if error_level in STACK_TRACE_LEVELS:
+                error_info.update(extract_traceback_info(exception))
+            else:
+                error_info['exception_type'] = exception.__class__.__name__
+                error_info['exception_message'] = str(exception)
+                error_info.update(_traceback_location(exception))
             
         # If no explicit file/line info and we have caller info, use it
         if not error_info['file_path'] and not file_path:
-            caller_frame = inspect.currentframe().f_back
+            caller_frame = sys._getframe(1)
             if caller_frame:
                 error_info['file_path'] = caller_frame.f_code.co_filename
                 error_info['line_number'] = caller_frame.f_lineno
                 error_info['function_name'] = caller_frame.f_code.co_name
         
+        fingerprint = ErrorLog.compute_fingerprint(
+            error_info['exception_type'],
+            error_info['file_path'],
+            error_info['line_number'],
+            error_info['exception_message'],
+        )
+        
+        # With background writes, repeats within the dedup window are only counted in memory
+        pending = 0
+        if getattr(settings, 'ERROR_TRACKING_ASYNC_WRITES', True):
+            suppressed, pending = debounce_hit(fingerprint)
+            if suppressed:
+                return None
+        
         # Get user from request if not provided
         if not user and request and hasattr(request, 'user') and request.user.is_authenticated:
             user = request.user
@@ -174,13 +252,7 @@ def track_error(
             
         # Add user details if available
         if user:
-            combined_debug_details['user'] = {
-                'id': user.id,
-                'username': getattr(user, 'username', ''),
-                'email': getattr(user, 'email', ''),
-                'is_staff': getattr(user, 'is_staff', False),
-                'is_superuser': getattr(user, 'is_superuser', False),
-            }
+            combined_debug_details['user'] = get_user_details(user, request)
         
         # Add environment information
         combined_debug_details['environment'] = {
@@ -190,64 +262,28 @@ def track_error(
             'platform': sys.platform,
         }
         
-        if DEBUG_ERROR_TRACKING:
-            logger.debug(f"[ERROR_TRACKING] Prepared error info: {error_info}")
-            logger.debug(f"[ERROR_TRACKING] Debug details keys: {list(combined_debug_details.keys())}")
-        
-        # Try to find existing error to update count
-        existing_error = ErrorLog.objects.filter(
-            exception_type=error_info['exception_type'],
-            exception_message=error_info['exception_message'],
-            file_path=error_info['file_path'],
-            line_number=error_info['line_number'],
-            resolved=False
-        ).first()
-        
-        if existing_error:
-            existing_error.count += 1
-            existing_error.last_occurrence = timezone.now()
-            existing_error.debug_details.update(combined_debug_details)
-            existing_error.save()
-            
-            if DEBUG_ERROR_TRACKING:
-                logger.debug(f"[ERROR_TRACKING] Updated existing error #{existing_error.id}, count: {existing_error.count}")
-            
-            return existing_error
-        
-        # Create new error log
-        error_log = ErrorLog.objects.create(
-            error_level=error_level,
-            exception_type=error_info['exception_type'],
-            exception_message=error_info['exception_message'],
-            file_path=error_info['file_path'],
-            line_number=error_info['line_number'],
-            function_name=error_info['function_name'],
-            user=user,
-            request_method=getattr(request, 'method', '') if request else '',
-            request_path=getattr(request, 'path', '') if request else '',
-            user_agent=request.META.get('HTTP_USER_AGENT', '') if request else '',
-            ip_address=get_client_ip(request),
-            stack_trace=error_info['stack_trace'],
-            debug_details=combined_debug_details,
-        )
+        logger.debug("[ERROR_TRACKING] Prepared error info: %r", error_info)
         
-        if DEBUG_ERROR_TRACKING:
-            logger.debug(f"[ERROR_TRACKING] Created new error log #{error_log.id}")
-        
-        # Log to Django logger as well
-        log_message = f"Error tracked #{error_log.id}: {error_info['exception_type']} - {error_info['exception_message']}"
-        if error_level == ErrorLevel.CRITICAL:
-            logger.critical(log_message)
-        elif error_level == ErrorLevel.ERROR:
-            logger.error(log_message)
-        elif error_level == ErrorLevel.WARNING:
-            logger.warning(log_message)
-        elif error_level == ErrorLevel.INFO:
-            logger.info(log_message)
-        else:
-            logger.debug(log_message)
+        fields = {
+            'fingerprint': fingerprint,
+            'error_level': error_level,
+            'exception_type': error_info['exception_type'],
+            'exception_message': error_info['exception_message'],
+            'file_path': error_info['file_path'],
+            'line_number': error_info['line_number'],
+            'function_name': error_info['function_name'],
+            'user_id': user.id if user else None,
+            'request_method': getattr(request, 'method', '') if request else '',
+            'request_path': getattr(request, 'path', '') if request else '',
+            'user_agent': request.META.get('HTTP_USER_AGENT', '') if request else '',
+            'ip_address': get_client_ip(request),
+            'stack_trace': error_info['stack_trace'],
+            'debug_details': combined_debug_details,
+            'count': 1 + pending,
+            'last_occurrence': timezone.now(),
+        }
         
-        return error_log
+        return _save_error(fields)
         
     except Exception as tracking_error:
         # Don't let error tracking itself fail the application
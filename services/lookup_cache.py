@@ -0,0 +1,29 @@
+from typing import Callable, List, Optional
+from django.core.cache import cache
+
+USERS_CACHE_KEY = 'errtrack:users'
+LOOKUPS_CACHE_TIMEOUT = 600
+
+# Marker for users already seen, so only genuinely new ones invalidate the choices
+KNOWN_USER_KEY = 'errtrack:known_user:{}'
+
+
+def cached_lookup(key: str, compute: Callable[[], List]) -> List:
+    """Return admin filter choices from the cache, computing them on a miss."""
+    values = cache.get(key)
+    if values is None:
+        values = compute()
+        cache.set(key, values, LOOKUPS_CACHE_TIMEOUT)
+    return values
+
+
+def invalidate_lookups():
+    """Drop cached admin filter choices so new users show up."""
+    cache.delete(USERS_CACHE_KEY)
+
+
+def note_lookup_values(user_id: Optional[int]):
+    """Invalidate the user filter choices only when a new error brings a new user."""
+    # cache.add() is atomic and only succeeds the first time a value is seen
+    if user_id is not None and cache.add(KNOWN_USER_KEY.format(user_id), True, None):
+        invalidate_lookups()
@@ -0,0 +1,37 @@
+# Trigram index name -> ErrorLog column searched by the admin
+TRIGRAM_INDEXES = {
+    'errlog_exc_type_trgm': 'exception_type',
+    'errlog_msg_trgm': 'exception_message',
+    'errlog_file_path_trgm': 'file_path',
+    'errlog_function_trgm': 'function_name',
+    'errlog_request_path_trgm': 'request_path',
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """
+    RunPython forward step creating the admin search indexes.
+
+    The admin search runs UPPER(col) LIKE '%term%', which only a pg_trgm GIN index
+    on UPPER(col) can serve. Other databases have no equivalent and are skipped.
+    The indexes are built CONCURRENTLY so writes continue meanwhile, which needs
+    a migration with atomic = False.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    # Same statement as TrigramExtension, which can't be imported without psycopg
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    table = schema_editor.quote_name(apps.get_model('error_tracking', 'ErrorLog')._meta.db_table)
+    for name, column in TRIGRAM_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {schema_editor.quote_name(name)} '
+            f'ON {table} USING gin (UPPER({schema_editor.quote_name(column)}) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    """RunPython reverse step for create_trigram_indexes; leaves pg_trgm installed."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {schema_editor.quote_name(name)}')
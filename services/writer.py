@@ -0,0 +1,420 @@
+import atexit
+import collections
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Optional, Dict, Any, List
+from django.db import connections, router, transaction, close_old_connections
+from django.db.models import F, JSONField, Value
+from django.db.models.expressions import CombinedExpression
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models.signals import post_save
+from django.utils import timezone
+from superapp.apps.error_tracking.models import ErrorLog, ErrorLevel, ErrorLogDetails, ExceptionTypeStat
+
+logger = logging.getLogger(__name__)
+
+QUEUE_MAX_SIZE = 10_000
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 0.05
+
+# Identical errors within DEDUP_WINDOW seconds are counted in memory, up to
+# DEDUP_MAX_HITS per write, for at most DEDUP_MAX_ENTRIES fingerprints.
+# The writer thread writes the held count out once the window is over.
+DEDUP_WINDOW = 1.0
+DEDUP_MAX_HITS = 100
+DEDUP_MAX_ENTRIES = 1024
+
+# Repeats rewrite the (large) jsonb details row at most once per interval per error
+DETAILS_REFRESH_INTERVAL = 60
+
+# Payload keys stored on ErrorLogDetails rather than the ErrorLog row
+DETAIL_FIELDS = ('user_agent', 'stack_trace', 'debug_details')
+
+_LOG_LEVELS = {
+    ErrorLevel.DEBUG: logging.DEBUG,
+    ErrorLevel.INFO: logging.INFO,
+    ErrorLevel.WARNING: logging.WARNING,
+    ErrorLevel.ERROR: logging.ERROR,
+    ErrorLevel.CRITICAL: logging.CRITICAL,
+}
+
+_QUEUE = queue.Queue(QUEUE_MAX_SIZE)
+_worker = None
+_worker_lock = threading.Lock()
+
+_DEDUP = collections.OrderedDict()
+_DEDUP_LOCK = threading.Lock()
+
+_details_refreshed = collections.OrderedDict()
+_details_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    """Forked workers (gunicorn --preload, Celery) start with an empty queue and no thread."""
+    global _QUEUE, _worker, _worker_lock, _DEDUP, _DEDUP_LOCK, _details_refreshed, _details_lock
+    _QUEUE = queue.Queue(QUEUE_MAX_SIZE)
+    _worker = None
+    _worker_lock = threading.Lock()
+    _DEDUP = collections.OrderedDict()
+    _DEDUP_LOCK = threading.Lock()
+    _details_refreshed = collections.OrderedDict()
+    _details_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _log_new_error(error_log: ErrorLog):
+    logger.log(
+        _LOG_LEVELS.get(error_log.error_level, logging.DEBUG),
+        f"Error tracked #{error_log.id}: {error_log.exception_type} - {error_log.exception_message}"
+    )
+
+
+def _merged_debug_details(debug_details: Dict[str, Any]):
+    """
+    Merge new debug details into the stored ones inside the UPDATE.
+
+    PostgreSQL does this server-side with jsonb ||, other backends keep the newest details.
+    """
+    if connections[router.db_for_write(ErrorLog)].vendor == 'postgresql':
+        return CombinedExpression(
+            F('debug_details'),
+            '||',
+            Value(debug_details, output_field=JSONField(encoder=DjangoJSONEncoder)),
+            output_field=JSONField(encoder=DjangoJSONEncoder),
+        )
+    return debug_details
+
+
+def _split_fields(fields: Dict[str, Any]):
+    """Split a flat occurrence payload into ErrorLog and ErrorLogDetails fields."""
+    error_fields = {key: value for key, value in fields.items() if key not in DETAIL_FIELDS}
+    detail_fields = {key: fields[key] for key in DETAIL_FIELDS}
+    return error_fields, detail_fields
+
+
+def _details_refresh_due(fingerprint: str) -> bool:
+    now = time.monotonic()
+    with _details_lock:
+        refreshed = _details_refreshed.get(fingerprint)
+        if refreshed is not None and now - refreshed < DETAILS_REFRESH_INTERVAL:
+            return False
+        _details_refreshed[fingerprint] = now
+        _details_refreshed.move_to_end(fingerprint)
+        if len(_details_refreshed) > DEDUP_MAX_ENTRIES:
+            _details_refreshed.popitem(last=False)
+        return True
+
+
+def _increment_existing_error(fields: Dict[str, Any]) -> bool:
+    """Atomically add an occurrence count to the matching unresolved error."""
+    updated = ErrorLog.objects.filter(fingerprint=fields['fingerprint'], resolved=False).update(
+        count=F('count') + fields['count'],
+        last_occurrence=fields['last_occurrence'],
+        updated_at=fields['last_occurrence'],
+    )
+    if not updated:
+        return False
+    
+    if _details_refresh_due(fields['fingerprint']):
+        ErrorLogDetails.objects.filter(error__fingerprint=fields['fingerprint']).update(
+            debug_details=_merged_debug_details(fields['debug_details']),
+            updated_at=fields['last_occurrence'],
+        )
+        # Repeats keep the type near the top of the admin dropdown, checked on the same throttle
+        ExceptionTypeStat.objects.filter(
+            name=fields['exception_type'],
+            last_seen__lt=fields['last_occurrence'],
+        ).update(last_seen=fields['last_occurrence'], updated_at=fields['last_occurrence'])
+    return True
+
+
+def _record_exception_types(error_logs: List[ErrorLog]):
+    """Keep the per-type counter table in step with newly inserted errors."""
+    counts = collections.Counter()
+    last_seen = {}
+    for error_log in error_logs:
+        counts[error_log.exception_type] += 1
+        last_seen[error_log.exception_type] = max(
+            error_log.last_occurrence,
+            last_seen.get(error_log.exception_type, error_log.last_occurrence),
+        )
+    connection = connections[router.db_for_write(ExceptionTypeStat)]
+    # New types go in with count=0; Django cannot add EXCLUDED.count on conflict,
+    # so the counts are bumped with one F() UPDATE per type below
+    ExceptionTypeStat.objects.bulk_create(
+        [ExceptionTypeStat(name=name, last_seen=last_seen[name]) for name in counts],
+        update_conflicts=True,
+        # MySQL upserts on any unique key and rejects an explicit target
+        unique_fields=['name'] if connection.features.supports_update_conflicts_with_target else None,
+        update_fields=['last_seen', 'updated_at'],
+    )
+    for name, count in counts.items():
+        ExceptionTypeStat.objects.filter(name=name).update(count=F('count') + count)
+
+
+def _log_dropped(fields: Dict[str, Any], write_error: Exception):
+    logger.error(
+        f"Error tracking write failed, dropped {fields['count']} occurrence(s) of "
+        f"{fields['exception_type']} - {fields['exception_message']}: {write_error}",
+        exc_info=True
+    )
+
+
+def _notify_new_error(error_log: ErrorLog):
+    # bulk_create skips model signals, send post_save so receivers still see new errors
+    post_save.send(
+        sender=ErrorLog,
+        instance=error_log,
+        created=True,
+        update_fields=None,
+        raw=False,
+        using=error_log._state.db,
+    )
+    _log_new_error(error_log)
+
+
+def _upsert_new_error(fields: Dict[str, Any]) -> Optional[ErrorLog]:
+    """
+    Insert a new error and its details with INSERT ... ON CONFLICT, then count the occurrence.
+
+    The row goes in with count=0 so that a concurrent insert of the same fingerprint
+    is absorbed by the conflict clause instead of raising IntegrityError. Returns
+    None when that happened and the occurrence was added to the other row instead.
+    """
+    connection = connections[router.db_for_write(ErrorLog)]
+    error_fields, detail_fields = _split_fields(fields)
+    error_log = ErrorLog(**{**error_fields, 'count': 0})
+    with transaction.atomic(using=connection.alias):
+        ErrorLog.objects.bulk_create(
+            [error_log],
+            update_conflicts=True,
+            # MySQL upserts on any unique key and rejects an explicit target
+            unique_fields=['fingerprint'] if connection.features.supports_update_conflicts_with_target else None,
+            update_fields=['last_occurrence', 'updated_at'],
+        )
+        # Only a row inserted here can still have count=0: the conflict clause waits
+        # for a concurrent insert to commit, and that commit includes its count
+        inserted = ErrorLog.objects.filter(fingerprint=fields['fingerprint'], count=0).update(count=fields['count'])
+        if not inserted:
+            _increment_existing_error(fields)
+            return None
+
+        if error_log.pk is None:
+            # MySQL does not return primary keys from bulk inserts
+            error_log.pk = ErrorLog.objects.values_list('pk', flat=True).get(fingerprint=error_log.fingerprint)
+        ErrorLogDetails.objects.bulk_create([ErrorLogDetails(error=error_log, **detail_fields)])
+    error_log.count = fields['count']
+    return error_log
+
+
+def write_error_log(fields: Dict[str, Any]) -> Optional[ErrorLog]:
+    """
+    Synchronously record an error occurrence.
+
+    Returns the new ErrorLog instance, or None if an existing error was updated.
+    """
+    if _increment_existing_error(fields):
+        return None
+
+    error_log = _upsert_new_error(fields)
+    if error_log is None:
+        return None
+    _record_exception_types([error_log])
+    _notify_new_error(error_log)
+    return error_log
+
+
+def flush_batch(batch: List[Dict[str, Any]]):
+    """Write a batch of queued occurrences, collapsing repeats of the same error."""
+    grouped = {}
+    for fields in batch:
+        entry = grouped.get(fields['fingerprint'])
+        if entry is None:
+            grouped[fields['fingerprint']] = dict(fields)
+        else:
+            entry['count'] += fields['count']
+            # Held dedup counts can be older than occurrences queued after them
+            entry['last_occurrence'] = max(entry['last_occurrence'], fields['last_occurrence'])
+            entry['debug_details'] = fields['debug_details']
+
+    new_errors = []
+    for fields in grouped.values():
+        try:
+            if not _increment_existing_error(fields):
+                new_errors.append(_split_fields(fields))
+        except Exception as write_error:
+            _log_dropped(fields, write_error)
+    if not new_errors:
+        return
+
+    try:
+        with transaction.atomic():
+            created = ErrorLog.objects.bulk_create([ErrorLog(**error_fields) for error_fields, _ in new_errors])
+            if any(error_log.pk is None for error_log in created):
+                # MySQL does not return primary keys from bulk inserts
+                pks = dict(ErrorLog.objects.filter(
+                    fingerprint__in=[error_log.fingerprint for error_log in created]
+                ).values_list('fingerprint', 'pk'))
+                for error_log in created:
+                    error_log.pk = pks[error_log.fingerprint]
+            ErrorLogDetails.objects.bulk_create([
+                ErrorLogDetails(error=error_log, **detail_fields)
+                for error_log, (_, detail_fields) in zip(created, new_errors)
+            ])
+    except Exception:
+        # Some of these were inserted concurrently or one payload can't be stored;
+        # fall back to one write each so only the failing occurrence is dropped
+        for error_fields, detail_fields in new_errors:
+            fields = {**error_fields, **detail_fields}
+            try:
+                write_error_log(fields)
+            except Exception as write_error:
+                _log_dropped(fields, write_error)
+        return
+
+    _record_exception_types(created)
+    for error_log in created:
+        _notify_new_error(error_log)
+
+
+def _held_occurrences(entry: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        **entry['fields'],
+        'count': entry['pending'],
+        'last_occurrence': entry['last_occurrence'],
+    }
+
+
+def _pop_held_occurrences(expired_only: bool = True) -> List[Dict[str, Any]]:
+    """Close dedup windows and return the occurrences they still hold."""
+    now = time.monotonic()
+    with _DEDUP_LOCK:
+        fingerprints = [
+            fingerprint for fingerprint, entry in _DEDUP.items()
+            if not expired_only or now - entry['started'] >= DEDUP_WINDOW
+        ]
+        entries = [_DEDUP.pop(fingerprint) for fingerprint in fingerprints]
+    return [_held_occurrences(entry) for entry in entries if entry['pending']]
+
+
+def _drain() -> List[Dict[str, Any]]:
+    # Wake up regularly even when idle so held dedup counts are written out
+    try:
+        batch = [_QUEUE.get(timeout=DEDUP_WINDOW / 2)]
+    except queue.Empty:
+        return []
+    deadline = time.monotonic() + FLUSH_INTERVAL
+    while len(batch) < BATCH_SIZE:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(_QUEUE.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+
+def _run():
+    while True:
+        batch = _pop_held_occurrences() + _drain()
+        if not batch:
+            continue
+        close_old_connections()
+        try:
+            flush_batch(batch)
+        except Exception as flush_error:
+            logger.error(f"Error tracking flush failed, dropped {len(batch)} error(s): {flush_error}", exc_info=True)
+        finally:
+            # The thread may then sit idle on the queue for a long time; don't hold
+            # a connection past CONN_MAX_AGE or one broken by the failed flush
+            close_old_connections()
+
+
+def start_writer():
+    """Start the background writer thread if it is not running in this process."""
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        return
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, name='error-tracking-writer', daemon=True)
+            _worker.start()
+
+
+def enqueue_error_log(fields: Dict[str, Any]):
+    """
+    Queue an error occurrence for the background writer.
+
+    Raises queue.Full instead of blocking when the writer falls behind.
+    """
+    start_writer()
+    _QUEUE.put_nowait(fields)
+
+
+def debounce_hit(fingerprint: str):
+    """
+    Check a hit against the process-local dedup window.
+
+    Returns (suppressed, pending). Suppressed hits are only counted in memory;
+    pending is the suppressed count the caller must write along with this hit
+    once the window is over.
+    """
+    now = time.monotonic()
+    with _DEDUP_LOCK:
+        entry = _DEDUP.get(fingerprint)
+        if entry is None:
+            return False, 0
+        if now - entry['started'] < DEDUP_WINDOW and entry['pending'] < DEDUP_MAX_HITS:
+            entry['pending'] += 1
+            entry['last_occurrence'] = timezone.now()
+            _DEDUP.move_to_end(fingerprint)
+            return True, 0
+        del _DEDUP[fingerprint]
+        return False, entry['pending']
+
+
+def remember_write(fields: Dict[str, Any]):
+    """Open a dedup window for a queued occurrence."""
+    evicted = []
+    with _DEDUP_LOCK:
+        _DEDUP[fields['fingerprint']] = {
+            'started': time.monotonic(),
+            'pending': 0,
+            'fields': fields,
+            'last_occurrence': fields['last_occurrence'],
+        }
+        _DEDUP.move_to_end(fields['fingerprint'])
+
+        # Entries are kept in least recently hit order
+        while len(_DEDUP) > DEDUP_MAX_ENTRIES:
+            _, oldest = _DEDUP.popitem(last=False)
+            if oldest['pending']:
+                evicted.append(_held_occurrences(oldest))
+
+    for held in evicted:
+        try:
+            enqueue_error_log(held)
+        except queue.Full:
+            logger.error(f"Error tracking queue is full, dropped {held['count']} occurrence(s) of {held['exception_type']}")
+
+
+@atexit.register
+def flush_pending():
+    """Write whatever is still queued or held in dedup windows when the process exits."""
+    batch = _pop_held_occurrences(expired_only=False)
+    while True:
+        try:
+            batch.append(_QUEUE.get_nowait())
+        except queue.Empty:
+            break
+    if batch:
+        try:
+            flush_batch(batch)
+        except Exception as flush_error:
+            logger.error(f"Error tracking flush failed, dropped {len(batch)} error(s): {flush_error}", exc_info=True)
@@ -7,6 +7,9 @@ def extend_superapp_settings(main_settings):
         'superapp.apps.error_tracking',
     ]
 
+    # Write tracked errors from a background thread instead of the request path
+    main_settings.setdefault('ERROR_TRACKING_ASYNC_WRITES', True)
+
     # Add error tracking to admin navigation
     if 'UNFOLD' not in main_settings:
         main_settings['UNFOLD'] = {}
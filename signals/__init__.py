@@ -0,0 +1,3 @@
+from .error_log import invalidate_filter_lookups
+
+__all__ = ['invalidate_filter_lookups']
\ No newline at end of file
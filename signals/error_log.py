@@ -0,0 +1,10 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from superapp.apps.error_tracking.models import ErrorLog
+from superapp.apps.error_tracking.services.lookup_cache import note_lookup_values
+
+
+@receiver(post_save, sender=ErrorLog)
+def invalidate_filter_lookups(sender, instance, created, **kwargs):
+    if created:
+        note_lookup_values(instance.user_id)